@@ -1,14 +1,22 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form, Request, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from starlette.responses import Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from typing import Callable, List, Optional
+import asyncio
+import hashlib
+import io
+import json
+import re
 import uuid
+import zlib
 from datetime import datetime, timezone, timedelta
 import jwt
 from passlib.context import CryptContext
@@ -18,13 +26,9 @@ import base64
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
-# Create the main app without a prefix
-app = FastAPI()
+# MongoDB connection, opened on startup by connect_db()
+client = None
+db = None
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -45,20 +49,26 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
-def create_access_token(data: dict):
+def prewarm_auth():
+    # Load the bcrypt backend and JWT signer up front so the first login
+    # after a worker boots does not pay for it
+    pwd_context.verify("warmup", pwd_context.hash("warmup"))
+    jwt.decode(create_access_token({"sub": "warmup"}), SECRET_KEY, algorithms=[ALGORITHM])
+
+def create_access_token(data: dict, expires_minutes: float = ACCESS_TOKEN_EXPIRE_MINUTES):
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    expire = datetime.now(timezone.utc) + timedelta(minutes=expires_minutes)
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_user_from_token(token: str, scope: Optional[str] = None):
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
         role: str = payload.get("role")
-        if user_id is None:
+        # Scoped tokens (e.g. the live events stream token) are only valid for their own endpoint
+        if user_id is None or payload.get("scope") != scope:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
         
         # Fetch user from database
@@ -71,6 +81,98 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await get_user_from_token(credentials.credentials)
+
+
+# Live Events
+# Maximum number of concurrent SSE connections per worker, and per user.
+# Connections beyond either limit are rejected with 503/429 so a reconnect
+# storm cannot exhaust the worker's file descriptors.
+MAX_EVENT_STREAMS = int(os.environ.get('MAX_EVENT_STREAMS', '500'))
+MAX_EVENT_STREAMS_PER_USER = int(os.environ.get('MAX_EVENT_STREAMS_PER_USER', '5'))
+# EventSource cannot send headers, so the stream takes its token in the query
+# string, where it ends up in access logs. Stream tokens are therefore minted
+# separately, scoped to the stream and short-lived.
+EVENT_STREAM_TOKEN_MINUTES = 1
+EVENT_QUEUE_SIZE = 100
+EVENT_KEEPALIVE_SECONDS = 15
+
+class EventSubscriber:
+    def __init__(self, user: dict):
+        self.user = user
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+        self.overflowed = False
+
+class EventBus:
+    """In-process pub/sub used to push record deltas to SSE clients.
+
+    Each event carries an ``audience`` predicate that is evaluated against the
+    subscribed user, so clients only receive records they could also read
+    through the regular REST endpoints.
+    """
+
+    def __init__(self):
+        self.subscribers: set = set()
+
+    def count_for(self, user_id: str) -> int:
+        return sum(1 for sub in self.subscribers if sub.user['id'] == user_id)
+
+    def subscribe(self, user: dict) -> EventSubscriber:
+        # Check and register in one synchronous step, so a burst of
+        # connections cannot all pass the check before any of them counts
+        if len(self.subscribers) >= MAX_EVENT_STREAMS:
+            raise HTTPException(status_code=503, detail="Too many live connections")
+        if self.count_for(user['id']) >= MAX_EVENT_STREAMS_PER_USER:
+            raise HTTPException(status_code=429, detail="Too many live connections for this user")
+        subscriber = EventSubscriber(user)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: EventSubscriber):
+        self.subscribers.discard(subscriber)
+
+    def publish(self, event_type: str, data: dict, audience: Callable[[dict], bool]):
+        message = {"type": event_type, "data": data}
+        for subscriber in list(self.subscribers):
+            if subscriber.overflowed or not audience(subscriber.user):
+                continue
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Slow client: drop the stream, it will reconnect and refetch
+                subscriber.overflowed = True
+
+event_bus = EventBus()
+
+class EventStreamResponse(StreamingResponse):
+    """Streams a subscriber's events and releases its slot however the response ends."""
+
+    def __init__(self, subscriber: EventSubscriber, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.subscriber = subscriber
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            event_bus.unsubscribe(self.subscriber)
+
+def hr_or_self(user_id: str) -> Callable[[dict], bool]:
+    return lambda viewer: viewer['role'] == 'hr' or viewer['id'] == user_id
+
+def staff_or_self(user_id: str) -> Callable[[dict], bool]:
+    return lambda viewer: viewer['role'] in ['hr', 'employee'] or viewer['id'] == user_id
+
+def user_audience(user: dict) -> Callable[[dict], bool]:
+    # Mirrors the access rules of GET /users
+    def audience(viewer: dict) -> bool:
+        if viewer['role'] == 'hr' or viewer['id'] == user['id']:
+            return True
+        return (viewer['role'] == 'employee' and user['role'] == 'intern'
+                and user.get('mentor_assigned') == viewer['id'])
+    return audience
+
 
 # Models
 class UserBase(BaseModel):
@@ -190,6 +292,7 @@ async def signup_intern(intern: InternCreate):
     token = create_access_token({"sub": created_user['id'], "role": "intern"})
     
     created_user.pop('password')
+    event_bus.publish("user.created", created_user, user_audience(created_user))
     return {"token": token, "user": created_user}
 
 @api_router.post("/auth/signup/employee")
@@ -219,6 +322,7 @@ async def signup_employee(employee: EmployeeCreate):
     token = create_access_token({"sub": created_user['id'], "role": "employee"})
     
     created_user.pop('password')
+    event_bus.publish("user.created", created_user, user_audience(created_user))
     return {"token": token, "user": created_user}
 
 @api_router.post("/auth/signup/hr")
@@ -242,6 +346,7 @@ async def signup_hr(hr: HRCreate):
     token = create_access_token({"sub": created_user['id'], "role": "hr"})
     
     created_user.pop('password')
+    event_bus.publish("user.created", created_user, user_audience(created_user))
     return {"token": token, "user": created_user}
 
 @api_router.post("/auth/login")
@@ -259,6 +364,114 @@ async def login(login_req: LoginRequest):
 async def get_me(current_user: dict = Depends(get_current_user)):
     return current_user
 
+# Avatars
+# Uploaded profile pictures are decoded once and re-encoded into these square
+# JPEG variants. Users reference them by URL: "profile" on the user record,
+# "thumb" in list responses.
+AVATAR_SIZES = {"thumb": 64, "profile": 256}
+MAX_AVATAR_BYTES = 5 * 1024 * 1024
+
+def render_avatar_variants(contents: bytes) -> dict:
+    """Decode an image and return {variant: jpeg bytes}. Runs in the process pool."""
+    from PIL import Image, ImageOps
+
+    try:
+        image = ImageOps.exif_transpose(Image.open(io.BytesIO(contents)))
+    except Image.DecompressionBombError as e:
+        # Not an OSError, so it would otherwise surface as a 500
+        raise ValueError(str(e)) from e
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    else:
+        image = image.convert("RGB")
+    
+    variants = {}
+    for variant, size in AVATAR_SIZES.items():
+        buffer = io.BytesIO()
+        ImageOps.fit(image, (size, size), Image.LANCZOS).save(buffer, "JPEG", quality=85, optimize=True)
+        variants[variant] = buffer.getvalue()
+    return variants
+
+async def store_avatar(user_id: str, contents: bytes) -> dict:
+    if len(contents) > MAX_AVATAR_BYTES:
+        raise HTTPException(status_code=400, detail="Image file is too large")
+    # Content-addressed: re-uploading the same image reuses the stored variants
+    avatar_id = hashlib.sha256(contents).hexdigest()
+    if not await db.avatars.find_one({"id": avatar_id}, {"_id": 1}):
+        try:
+            variants = await run_in_process(render_avatar_variants, contents)
+        except (OSError, ValueError):
+            # Pillow's UnidentifiedImageError is an OSError; pool failures propagate
+            raise HTTPException(status_code=400, detail="Could not read image file")
+        await db.avatars.update_one(
+            {"id": avatar_id},
+            {"$set": {
+                "id": avatar_id,
+                "variants": {k: base64.b64encode(v).decode('utf-8') for k, v in variants.items()},
+                "created_at": datetime.now(timezone.utc).isoformat()
+            }},
+            upsert=True
+        )
+    
+    urls = {variant: f"/api/avatars/{avatar_id}/{variant}" for variant in AVATAR_SIZES}
+    await db.users.update_one(
+        {"id": user_id},
+        {"$set": {"profile_picture": urls["profile"], "profile_thumbnail": urls["thumb"]}}
+    )
+    return urls
+
+def list_view(user: dict) -> dict:
+    # List responses carry the thumbnail instead of the profile-size image.
+    # Pictures still stored inline (not yet backfilled) are left out entirely.
+    thumbnail = user.pop('profile_thumbnail', None)
+    if thumbnail:
+        user['profile_picture'] = thumbnail
+    elif (user.get('profile_picture') or "").startswith("data:"):
+        user['profile_picture'] = None
+    return user
+
+@api_router.get("/avatars/{avatar_id}/{variant}")
+async def get_avatar(avatar_id: str, variant: str):
+    # Unauthenticated so <img> tags can load it; the id is the image's SHA-256
+    if variant not in AVATAR_SIZES:
+        raise HTTPException(status_code=404, detail="Avatar not found")
+    avatar = await db.avatars.find_one({"id": avatar_id}, {"_id": 0, f"variants.{variant}": 1})
+    if not avatar:
+        raise HTTPException(status_code=404, detail="Avatar not found")
+    
+    return Response(
+        content=base64.b64decode(avatar['variants'][variant]),
+        media_type="image/jpeg",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
+
+@api_router.post("/avatars/backfill")
+async def backfill_avatars(current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'hr':
+        raise HTTPException(status_code=403, detail="Only HR can backfill avatars")
+    
+    job = await enqueue_job("avatars.backfill", {}, current_user)
+    return {"message": "Avatar backfill queued", "job_id": job['id']}
+
+async def run_avatar_backfill(job: dict, progress: Callable):
+    # Convert profile pictures stored inline as data URLs before thumbnails existed
+    query = {"profile_picture": {"$regex": "^data:"}}
+    total = await db.users.count_documents(query)
+    converted = failed = 0
+    async for user in db.users.find(query, {"_id": 0, "id": 1, "profile_picture": 1}):
+        try:
+            contents = base64.b64decode(user['profile_picture'].split(",", 1)[1])
+            await store_avatar(user['id'], contents)
+            converted += 1
+        except (IndexError, ValueError, HTTPException):
+            # Malformed data URL (binascii.Error is a ValueError) or unreadable image
+            failed += 1
+        await progress((converted + failed) / max(total, 1))
+    return {"converted": converted, "failed": failed}
+
 # File Upload Routes
 @api_router.post("/upload/profile-picture")
 async def upload_profile_picture(
@@ -269,18 +482,11 @@ async def upload_profile_picture(
     if file.content_type not in ["image/jpeg", "image/jpg", "image/png"]:
         raise HTTPException(status_code=400, detail="Invalid file type. Only JPG, JPEG, PNG allowed")
     
-    # Read and encode file
-    contents = await file.read()
-    encoded = base64.b64encode(contents).decode('utf-8')
-    file_data = f"data:{file.content_type};base64,{encoded}"
+    # One byte over the limit is enough for store_avatar to reject it
+    contents = await file.read(MAX_AVATAR_BYTES + 1)
+    urls = await store_avatar(current_user['id'], contents)
     
-    # Update user profile
-    await db.users.update_one(
-        {"id": current_user['id']},
-        {"$set": {"profile_picture": file_data}}
-    )
-    
-    return {"message": "Profile picture uploaded successfully", "file_data": file_data}
+    return {"message": "Profile picture uploaded successfully", "file_data": urls["profile"]}
 
 @api_router.post("/upload/resume")
 async def upload_resume(
@@ -334,7 +540,7 @@ async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
             "total_users": total_users,
             "total_interns": total_interns,
             "total_employees": total_employees,
-            "recent_activity": recent_users
+            "recent_activity": [list_view(u) for u in recent_users]
         }
     
     elif role == 'employee':
@@ -351,7 +557,7 @@ async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
         
         return {
             "total_interns_under_me": interns_under_me,
-            "interns": interns_list,
+            "interns": [list_view(u) for u in interns_list],
             "my_profile": current_user
         }
     
@@ -368,7 +574,7 @@ async def get_users(current_user: dict = Depends(get_current_user)):
     if role == 'hr':
         # HR can see all users
         users = await db.users.find({}, {"_id": 0, "password": 0}).to_list(1000)
-        return users
+        return [list_view(u) for u in users]
     
     elif role == 'employee':
         # Employee can see interns under them
@@ -376,11 +582,11 @@ async def get_users(current_user: dict = Depends(get_current_user)):
             {"role": "intern", "mentor_assigned": current_user['id']},
             {"_id": 0, "password": 0}
         ).to_list(100)
-        return interns
+        return [list_view(u) for u in interns]
     
     else:
         # Interns can only see themselves
-        return [current_user]
+        return [list_view(dict(current_user))]
 
 @api_router.get("/users/{user_id}")
 async def get_user_by_id(user_id: str, current_user: dict = Depends(get_current_user)):
@@ -416,12 +622,11 @@ class OnboardingStatus(BaseModel):
     welcome_message: str = ""
     hr_contact: str = ""
 
-@api_router.post("/onboarding/create")
-async def create_onboarding(user_id: str, current_user: dict = Depends(get_current_user)):
-    if current_user['role'] != 'hr':
-        raise HTTPException(status_code=403, detail="Only HR can create onboarding records")
-    
-    onboarding = {
+class CohortOnboardingCreate(BaseModel):
+    user_ids: List[str]
+
+def build_onboarding_record(user_id: str) -> dict:
+    return {
         "id": str(uuid.uuid4()),
         "user_id": user_id,
         "application_status": "Under Review",
@@ -439,13 +644,37 @@ async def create_onboarding(user_id: str, current_user: dict = Depends(get_curre
         "hr_contact": "hr@company.com",
         "created_at": datetime.now(timezone.utc).isoformat()
     }
+
+@api_router.post("/onboarding/create")
+async def create_onboarding(user_id: str, current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'hr':
+        raise HTTPException(status_code=403, detail="Only HR can create onboarding records")
     
+    onboarding = build_onboarding_record(user_id)
     await db.onboarding.insert_one(onboarding)
     
     # Return without MongoDB _id
     onboarding.pop('_id', None)
     return {"message": "Onboarding record created", "data": onboarding}
 
+@api_router.post("/onboarding/create-cohort")
+async def create_cohort_onboarding(cohort: CohortOnboardingCreate, current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'hr':
+        raise HTTPException(status_code=403, detail="Only HR can create onboarding records")
+    
+    job = await enqueue_job("onboarding.cohort", {"user_ids": cohort.user_ids}, current_user)
+    return {"message": "Cohort onboarding queued", "job_id": job['id']}
+
+async def run_cohort_onboarding(job: dict, progress: Callable):
+    user_ids = job['params']['user_ids']
+    created = 0
+    for index, user_id in enumerate(user_ids, start=1):
+        if not await db.onboarding.find_one({"user_id": user_id}, {"_id": 1}):
+            await db.onboarding.insert_one(build_onboarding_record(user_id))
+            created += 1
+        await progress(index / len(user_ids))
+    return {"created": created, "skipped": len(user_ids) - created}
+
 @api_router.get("/onboarding/{user_id}")
 async def get_onboarding(user_id: str, current_user: dict = Depends(get_current_user)):
     # Check permissions
@@ -466,6 +695,9 @@ async def update_onboarding(user_id: str, updates: dict, current_user: dict = De
         {"user_id": user_id},
         {"$set": updates}
     )
+    onboarding = await db.onboarding.find_one({"user_id": user_id}, {"_id": 0})
+    if onboarding:
+        event_bus.publish("onboarding.updated", onboarding, hr_or_self(user_id))
     return {"message": "Onboarding updated successfully"}
 
 
@@ -527,9 +759,203 @@ async def add_payment(user_id: str, payment: dict, current_user: dict = Depends(
         {"user_id": user_id},
         {"$push": {"payment_history": payment_record}}
     )
+    event_bus.publish(
+        "payment.added",
+        {"user_id": user_id, "payment": payment_record},
+        hr_or_self(user_id)
+    )
     return {"message": "Payment added successfully"}
 
 
+# Payslips are rendered in bulk by a background job and stored in
+# db.payslips keyed by the SHA-256 of their canonical contents, so an
+# unchanged slip is never rendered or stored twice.
+PAYSLIP_CHUNK_SIZE = 50
+
+def payslip_key(slip: dict) -> str:
+    canonical = json.dumps(slip, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def render_payslip_pdf(slip: dict) -> bytes:
+    """Render a single-page payslip PDF. Pure and picklable, so it can run in the process pool."""
+    lines = [
+        f"Employee: {slip['full_name']}",
+        f"Employee ID: {slip.get('employee_id') or '-'}",
+        f"Role: {slip['role'].title()}",
+        "",
+        f"Pay period: {slip['period']}",
+        f"Payment date: {slip['payment_date']}",
+        f"Salary type: {slip['salary_type']}",
+        f"Bank account: {slip['bank_account']}",
+        "",
+        f"Amount: {slip['amount']:,.2f}",
+        f"Status: {slip['status']}",
+        "",
+        f"Reference: {slip['payment_id']}",
+    ]
+    text = "BT /F1 18 Tf 72 760 Td (Payslip) Tj /F1 11 Tf 16 TL T* T*"
+    for line in lines:
+        text += f" ({pdf_escape(line)}) '"
+    text += " ET"
+    stream = text.encode("latin-1", "replace")
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+        b"/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream",
+    ]
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        pdf += f"{offset:010d} 00000 n \n".encode()
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return pdf
+
+def render_payslip_batch(slips: List[dict]) -> List[bytes]:
+    return [render_payslip_pdf(slip) for slip in slips]
+
+def mask_account(account: str) -> str:
+    # Short account numbers are masked entirely rather than shown whole
+    account = account or ""
+    visible = 4 if len(account) >= 8 else 0
+    return "*" * (len(account) - visible) + account[len(account) - visible:]
+
+@api_router.post("/payroll/payslips/generate")
+async def generate_payslips(period: str, current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'hr':
+        raise HTTPException(status_code=403, detail="Only HR can generate payslips")
+    # strptime would also accept "2024-1", which then prefix-matches 2024-10..12
+    if not re.fullmatch(r"\d{4}-(0[1-9]|1[0-2])", period):
+        raise HTTPException(status_code=400, detail="Period must be in YYYY-MM format")
+    
+    job = await enqueue_job("payroll.payslips", {"period": period}, current_user)
+    return {"message": "Payslip generation queued", "job_id": job['id']}
+
+async def run_payslip_generation(job: dict, progress: Callable):
+    period = job['params']['period']
+    payrolls = await db.payroll.find(
+        {"payment_history.payment_date": {"$regex": f"^{period}-"}},
+        {"_id": 0}
+    ).to_list(None)
+    users = await db.users.find(
+        {"id": {"$in": [p['user_id'] for p in payrolls]}},
+        {"_id": 0, "id": 1, "full_name": 1, "employee_id": 1, "role": 1}
+    ).to_list(None)
+    users_by_id = {u['id']: u for u in users}
+
+    # (user_id, payment_id, key) for every payment in the period, plus the slip contents per key
+    entries = []
+    slips = {}
+    skipped = []
+    for payroll in payrolls:
+        user = users_by_id.get(payroll['user_id'])
+        if not user:
+            continue
+        for payment in payroll.get('payment_history', []):
+            if not (payment.get('payment_date') or "").startswith(period + "-"):
+                continue
+            # add_payment accepts any amount, so bad entries are skipped one by one
+            try:
+                amount = float(payment.get('amount') or 0)
+            except (TypeError, ValueError):
+                skipped.append({"payment_id": payment['id'], "error": "Invalid amount"})
+                continue
+            slip = {
+                "user_id": user['id'],
+                "full_name": user['full_name'],
+                "employee_id": user.get('employee_id'),
+                "role": user['role'],
+                "period": period,
+                "payment_id": payment['id'],
+                "payment_date": payment['payment_date'],
+                "amount": amount,
+                "status": payment.get('status', "Paid"),
+                "salary_type": payroll['salary_type'],
+                "bank_account": mask_account(payroll['bank_account']),
+            }
+            key = payslip_key(slip)
+            entries.append((user['id'], payment['id'], key))
+            slips[key] = slip
+
+    existing = await db.payslips.find({"id": {"$in": list(slips)}}, {"_id": 0, "id": 1}).to_list(None)
+    missing = [key for key in slips if key not in {e['id'] for e in existing}]
+
+    # Fan the rendering out over the process pool in chunks
+    chunks = [missing[i:i + PAYSLIP_CHUNK_SIZE] for i in range(0, len(missing), PAYSLIP_CHUNK_SIZE)]
+    rendered_chunks = await asyncio.gather(*(
+        run_in_process(render_payslip_batch, [slips[key] for key in chunk]) for chunk in chunks
+    ))
+    await progress(0.8)
+
+    # Upserts on the unique id, so a concurrent run for the same period
+    # cannot store a slip twice
+    now = datetime.now(timezone.utc).isoformat()
+    documents = [
+        UpdateOne(
+            {"id": key},
+            {"$setOnInsert": {
+                "id": key,
+                "user_id": slips[key]['user_id'],
+                "period": period,
+                "content_type": "application/pdf",
+                "data": base64.b64encode(pdf).decode('utf-8'),
+                "created_at": now
+            }},
+            upsert=True
+        )
+        for chunk, rendered in zip(chunks, rendered_chunks)
+        for key, pdf in zip(chunk, rendered)
+    ]
+    if documents:
+        await db.payslips.bulk_write(documents, ordered=False)
+
+    operations = [
+        UpdateOne(
+            {"user_id": user_id},
+            {"$set": {"payment_history.$[payment].slip_url": f"/api/payroll/slips/{key}"}},
+            array_filters=[{"payment.id": payment_id}]
+        )
+        for user_id, payment_id, key in entries
+    ]
+    if operations:
+        await db.payroll.bulk_write(operations, ordered=False)
+    return {
+        "payslips": len(entries),
+        "rendered": len(documents),
+        "reused": len(entries) - len(documents),
+        "skipped": skipped
+    }
+
+@api_router.get("/payroll/slips/{slip_id}")
+async def get_payslip(slip_id: str, current_user: dict = Depends(get_current_user)):
+    payslip = await db.payslips.find_one({"id": slip_id}, {"_id": 0})
+    if not payslip:
+        raise HTTPException(status_code=404, detail="Payslip not found")
+    if current_user['role'] != 'hr' and current_user['id'] != payslip['user_id']:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    # Content-addressed, so the response for a given URL never changes
+    return Response(
+        content=base64.b64decode(payslip['data']),
+        media_type=payslip['content_type'],
+        headers={
+            "Cache-Control": "private, max-age=31536000, immutable",
+            "Content-Disposition": f'inline; filename="payslip-{payslip["period"]}.pdf"'
+        }
+    )
+
+
 # ==================== PERFORMANCE MODULE ====================
 
 class PerformanceGoal(BaseModel):
@@ -607,6 +1033,9 @@ async def update_task(task_id: str, updates: dict, current_user: dict = Depends(
         {"id": task_id},
         {"$set": updates}
     )
+    task = await db.tasks.find_one({"id": task_id}, {"_id": 0})
+    if task:
+        event_bus.publish("task.updated", task, staff_or_self(task['user_id']))
     return {"message": "Task updated successfully"}
 
 class Feedback(BaseModel):
@@ -667,6 +1096,7 @@ async def check_in(current_user: dict = Depends(get_current_user)):
     
     result = await db.attendance.insert_one(attendance)
     attendance.pop('_id', None)
+    event_bus.publish("attendance.checkin", attendance, staff_or_self(current_user['id']))
     return {"message": "Checked in successfully", "time": attendance['check_in']}
 
 @api_router.post("/attendance/checkout")
@@ -699,22 +1129,57 @@ async def check_out(current_user: dict = Depends(get_current_user)):
     return {"message": "Checked out successfully", "hours_worked": round(hours_worked, 2)}
 
 @api_router.get("/attendance/overview/{user_id}")
-async def get_attendance_overview(user_id: str, current_user: dict = Depends(get_current_user)):
+async def get_attendance_overview(
+    user_id: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
     if current_user['role'] not in ['hr', 'employee'] and current_user['id'] != user_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    # Get all attendance records for the user
-    records = await db.attendance.find({"user_id": user_id}, {"_id": 0}).to_list(1000)
+    # Get attendance records for the user, optionally within a date range
+    date_range = date_range_filter(start_date, end_date)
+    query = {"user_id": user_id}
+    leave_query = {"user_id": user_id}
+    if date_range:
+        query["date"] = date_range
+        leave_query["start_date"] = date_range
+    records = await db.attendance.find(query, {"_id": 0}).to_list(1000)
+    leaves = await db.leaves.find(leave_query, {"_id": 0}).to_list(100)
+    
+    watermark = await archived_before()
+    if range_needs_archive(start_date, watermark):
+        if date_range:
+            records = merge_records(
+                await read_archive(db.attendance_archive, user_id, start_date, end_date, "date"), records
+            )
+            leaves = merge_records(
+                await read_archive(db.leaves_archive, user_id, start_date, end_date, "start_date"), leaves
+            )
+        else:
+            # The archive summaries are added below, so drop hot records
+            # that an in-flight archive run has already copied into a bucket
+            records = await drop_archived(db.attendance_archive, user_id, records, "date", watermark)
+            leaves = await drop_archived(db.leaves_archive, user_id, leaves, "start_date", watermark)
     
     # Calculate stats
     total_days = len(records)
     present_days = len([r for r in records if r.get('status') == 'Present'])
     total_hours = sum(r.get('hours_worked', 0) for r in records)
-    
-    # Get leaves
-    leaves = await db.leaves.find({"user_id": user_id}, {"_id": 0}).to_list(100)
     leave_taken = len([l for l in leaves if l.get('status') == 'Approved'])
     
+    if not date_range and watermark:
+        # Whole history: add the precomputed per-month archive summaries
+        # instead of decompressing every archived record
+        attendance_summary = await archive_summary(db.attendance_archive, user_id)
+        total_days += attendance_summary.get('total_days', 0)
+        present_days += attendance_summary.get('present_days', 0)
+        total_hours += attendance_summary.get('total_hours', 0)
+        leave_taken += (await archive_summary(db.leaves_archive, user_id)).get('approved', 0)
+        if len(records) < 30 and attendance_summary:
+            records = merge_records(await read_latest_archive(db.attendance_archive, user_id), records)
+    
     return {
         "total_days": total_days,
         "present_days": present_days,
@@ -748,11 +1213,24 @@ async def apply_leave(leave: LeaveRequest, current_user: dict = Depends(get_curr
     return {"message": "Leave application submitted successfully", "data": leave_data}
 
 @api_router.get("/attendance/leaves/{user_id}")
-async def get_leaves(user_id: str, current_user: dict = Depends(get_current_user)):
+async def get_leaves(
+    user_id: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
     if current_user['role'] not in ['hr', 'employee'] and current_user['id'] != user_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    leaves = await db.leaves.find({"user_id": user_id}, {"_id": 0}).to_list(100)
+    query = {"user_id": user_id}
+    date_range = date_range_filter(start_date, end_date)
+    if date_range:
+        query["start_date"] = date_range
+    leaves = await db.leaves.find(query, {"_id": 0}).to_list(100)
+    if range_needs_archive(start_date, await archived_before()):
+        leaves = merge_records(
+            await read_archive(db.leaves_archive, user_id, start_date, end_date, "start_date"), leaves
+        )
     return leaves
 
 @api_router.put("/attendance/leave/approve/{leave_id}")
@@ -764,18 +1242,439 @@ async def approve_leave(leave_id: str, status: str, current_user: dict = Depends
         {"id": leave_id},
         {"$set": {"status": status, "approved_by": current_user['id']}}
     )
+    leave = await db.leaves.find_one({"id": leave_id}, {"_id": 0})
+    if leave:
+        event_bus.publish("leave.updated", leave, staff_or_self(leave['user_id']))
     return {"message": f"Leave {status.lower()} successfully"}
 
-# Include the router in the main app
-app.include_router(api_router)
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# ==================== ATTENDANCE ARCHIVE ====================
+
+# Attendance and settled leave records older than this many days are moved
+# out of the hot collections into compressed per-user, per-month buckets in
+# db.attendance_archive / db.leaves_archive. Only whole months are archived.
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '365'))
+
+def archive_cutoff() -> str:
+    horizon = datetime.now(timezone.utc).date() - timedelta(days=ARCHIVE_AFTER_DAYS)
+    return horizon.replace(day=1).isoformat()
+
+def date_range_filter(start_date: Optional[str], end_date: Optional[str]) -> dict:
+    date_range = {}
+    if start_date:
+        date_range["$gte"] = start_date
+    if end_date:
+        date_range["$lte"] = end_date
+    return date_range
+
+async def archived_before() -> Optional[str]:
+    # Watermark: everything archived so far is dated before this day. It only
+    # ever moves forward, so raising ARCHIVE_AFTER_DAYS later does not hide
+    # records that were archived under the old setting.
+    state = await db.archive_state.find_one({"id": "attendance"}, {"_id": 0})
+    return state['archived_before'] if state else None
+
+def range_needs_archive(start_date: Optional[str], watermark: Optional[str]) -> bool:
+    return watermark is not None and (not start_date or start_date < watermark)
+
+def pack_records(records: List[dict]) -> bytes:
+    return zlib.compress(json.dumps(records, default=str).encode('utf-8'))
+
+def unpack_records(data: bytes) -> List[dict]:
+    return json.loads(zlib.decompress(data))
+
+def merge_records(archived: List[dict], hot: List[dict]) -> List[dict]:
+    # A record can briefly exist in both places while an archive run is in flight
+    hot_ids = {r['id'] for r in hot}
+    return [r for r in archived if r['id'] not in hot_ids] + hot
+
+def summarize_attendance(records: List[dict]) -> dict:
+    return {
+        "total_days": len(records),
+        "present_days": len([r for r in records if r.get('status') == 'Present']),
+        "total_hours": sum(r.get('hours_worked', 0) for r in records)
+    }
+
+def summarize_leaves(records: List[dict]) -> dict:
+    return {"approved": len([l for l in records if l.get('status') == 'Approved'])}
+
+async def read_archive(collection, user_id: str, start_date: Optional[str], end_date: Optional[str], date_field: str) -> List[dict]:
+    month_range = date_range_filter(start_date and start_date[:7], end_date and end_date[:7])
+    query = {"user_id": user_id}
+    if month_range:
+        query["month"] = month_range
+    records = []
+    async for bucket in collection.find(query, {"_id": 0, "data": 1}).sort("month", 1):
+        records.extend(
+            r for r in unpack_records(bucket['data'])
+            if (not start_date or r[date_field] >= start_date) and (not end_date or r[date_field] <= end_date)
+        )
+    return records
+
+async def drop_archived(archive, user_id: str, records: List[dict], date_field: str, watermark: str) -> List[dict]:
+    # Only records dated before the watermark can have been archived
+    candidates = [r['id'] for r in records if r[date_field] < watermark]
+    if not candidates:
+        return records
+    archived_ids = set()
+    async for bucket in archive.find({"user_id": user_id, "ids": {"$in": candidates}}, {"_id": 0, "ids": 1}):
+        archived_ids.update(bucket['ids'])
+    return [r for r in records if r['id'] not in archived_ids]
+
+async def read_latest_archive(collection, user_id: str) -> List[dict]:
+    bucket = await collection.find_one({"user_id": user_id}, {"_id": 0, "data": 1}, sort=[("month", -1)])
+    return unpack_records(bucket['data']) if bucket else []
+
+async def archive_summary(collection, user_id: str) -> dict:
+    totals = {}
+    async for bucket in collection.find({"user_id": user_id}, {"_id": 0, "summary": 1}):
+        for key, value in bucket['summary'].items():
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+async def flush_archive_bucket(source, archive, user_id: str, month: str, records: List[dict], summarize: Callable):
+    bucket_id = f"{user_id}:{month}"
+    existing = await archive.find_one({"id": bucket_id}, {"_id": 0, "data": 1})
+    if existing:
+        records = merge_records(unpack_records(existing['data']), records)
+    await archive.update_one(
+        {"id": bucket_id},
+        {"$set": {
+            "user_id": user_id,
+            "month": month,
+            "summary": summarize(records),
+            "ids": [r['id'] for r in records],
+            "data": pack_records(records),
+            "archived_at": datetime.now(timezone.utc).isoformat()
+        }},
+        upsert=True
+    )
+    # Only drop hot records once their bucket is safely written
+    await source.delete_many({"id": {"$in": [r['id'] for r in records]}})
+
+async def archive_collection(source, archive, query: dict, date_field: str, summarize: Callable) -> int:
+    archived = 0
+    current_key = None
+    batch = []
+    cursor = source.find(query, {"_id": 0}).sort([("user_id", 1), (date_field, 1)])
+    async for record in cursor:
+        key = (record['user_id'], record[date_field][:7])
+        if key != current_key and batch:
+            await flush_archive_bucket(source, archive, *current_key, batch, summarize)
+            archived += len(batch)
+            batch = []
+        current_key = key
+        batch.append(record)
+    if batch:
+        await flush_archive_bucket(source, archive, *current_key, batch, summarize)
+        archived += len(batch)
+    return archived
+
+@api_router.post("/attendance/archive")
+async def archive_attendance(current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'hr':
+        raise HTTPException(status_code=403, detail="Only HR can archive attendance data")
+    
+    job = await enqueue_job("attendance.archive", {}, current_user)
+    return {"message": "Attendance archival queued", "job_id": job['id']}
+
+async def run_attendance_archive(job: dict, progress: Callable):
+    cutoff = archive_cutoff()
+    # Raised before moving anything, so reads never miss a half-finished run
+    await db.archive_state.update_one(
+        {"id": "attendance"},
+        {"$max": {"archived_before": cutoff}},
+        upsert=True
+    )
+    attendance = await archive_collection(
+        db.attendance, db.attendance_archive, {"date": {"$lt": cutoff}}, "date", summarize_attendance
+    )
+    await progress(0.5)
+    # Pending leaves stay hot until they are approved or rejected
+    leaves = await archive_collection(
+        db.leaves, db.leaves_archive,
+        {"end_date": {"$lt": cutoff}, "status": {"$ne": "Pending"}}, "start_date", summarize_leaves
+    )
+    return {"cutoff": cutoff, "attendance_archived": attendance, "leaves_archived": leaves}
+
+
+# ==================== LIVE EVENTS ====================
+
+optional_security = HTTPBearer(auto_error=False)
+
+@api_router.post("/events/token")
+async def create_event_stream_token(current_user: dict = Depends(get_current_user)):
+    token = create_access_token(
+        {"sub": current_user['id'], "scope": "events"},
+        expires_minutes=EVENT_STREAM_TOKEN_MINUTES
+    )
+    return {"token": token}
+
+@api_router.get("/events/stream")
+async def stream_events(
+    request: Request,
+    token: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    # Clients that can send headers use their normal bearer token; EventSource
+    # passes a stream token from POST /events/token as a query param
+    if credentials:
+        current_user = await get_user_from_token(credentials.credentials)
+    elif token:
+        current_user = await get_user_from_token(token, scope="events")
+    else:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    subscriber = event_bus.subscribe(current_user)
+
+    async def event_generator():
+        yield "retry: 5000\n\n"
+        while not subscriber.overflowed:
+            try:
+                message = await asyncio.wait_for(subscriber.queue.get(), EVENT_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: {message['type']}\ndata: {json.dumps(message['data'], default=str)}\n\n"
+
+    return EventStreamResponse(
+        subscriber,
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# ==================== BACKGROUND JOBS ====================
+
+# Async workers per service process, and the size of the process pool used
+# for CPU-bound job steps. Jobs live in db.jobs so any worker can claim them.
+# The process pool defaults to an even share of the CPUs across the
+# WEB_CONCURRENCY uvicorn workers.
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '4'))
+JOB_PROCESS_WORKERS = int(os.environ.get(
+    'JOB_PROCESS_WORKERS',
+    str(max(1, (os.cpu_count() or 1) // int(os.environ.get('WEB_CONCURRENCY', '1'))))
+))
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_DELAY_SECONDS = 5
+JOB_POLL_SECONDS = 2
+# A running job holds a lease that its worker renews; a job whose lease has
+# expired belongs to a dead worker and may be claimed again
+JOB_LEASE_SECONDS = 60
+
+class JobCancelled(Exception):
+    pass
+
+job_wakeup = asyncio.Event()
+job_worker_tasks: list = []
+running_jobs: dict = {}
+process_pool = None
+
+def get_process_pool():
+    global process_pool
+    if process_pool is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Not fork: this process already runs Motor's threads, whose held
+        # locks would be copied into the children
+        process_pool = ProcessPoolExecutor(
+            max_workers=JOB_PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("forkserver")
+        )
+    return process_pool
+
+async def run_in_process(fn, *args):
+    """Run a CPU-bound, picklable function in the shared process pool."""
+    return await asyncio.get_running_loop().run_in_executor(get_process_pool(), fn, *args)
+
+def job_handlers() -> dict:
+    return {
+        "onboarding.cohort": run_cohort_onboarding,
+        "payroll.payslips": run_payslip_generation,
+        "attendance.archive": run_attendance_archive,
+        "avatars.backfill": run_avatar_backfill,
+    }
+
+async def enqueue_job(job_type: str, params: dict, current_user: dict) -> dict:
+    now = datetime.now(timezone.utc).isoformat()
+    job = {
+        "id": str(uuid.uuid4()),
+        "type": job_type,
+        "params": params,
+        "status": "Queued",  # Queued, Running, Completed, Failed, Cancelled
+        "progress": 0,
+        "result": None,
+        "error": None,
+        "attempts": 0,
+        "max_attempts": JOB_MAX_ATTEMPTS,
+        "run_after": now,
+        "created_by": current_user['id'],
+        "created_at": now,
+        "updated_at": now
+    }
+    await db.jobs.insert_one(job)
+    job.pop('_id', None)
+    job_wakeup.set()
+    return job
+
+def lease_expiry() -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=JOB_LEASE_SECONDS)).isoformat()
+
+def lease_filter(job: dict) -> dict:
+    # Matches only while this worker still owns the job
+    return {"id": job['id'], "status": "Running", "lease_id": job['lease_id']}
+
+async def claim_job() -> Optional[dict]:
+    now = datetime.now(timezone.utc).isoformat()
+    job = await db.jobs.find_one_and_update(
+        {"$or": [
+            {"status": "Queued", "run_after": {"$lte": now}},
+            {"status": "Running", "lease_until": {"$lt": now}}
+        ]},
+        {
+            "$set": {
+                "status": "Running",
+                "lease_id": str(uuid.uuid4()),
+                "lease_until": lease_expiry(),
+                "updated_at": now
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+    if job:
+        job.pop('_id', None)
+    return job
+
+async def renew_lease(job: dict, task: asyncio.Task):
+    lease_until = job['lease_until']
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        try:
+            result = await db.jobs.update_one(lease_filter(job), {"$set": {"lease_until": lease_expiry()}})
+        except Exception:
+            logger.exception("Could not renew lease of job %s", job['id'])
+            if datetime.now(timezone.utc).isoformat() < lease_until:
+                continue
+            result = None
+        if result is None or result.matched_count == 0:
+            # Cancelled, or the lease ran out and another worker may own the job now
+            task.cancel()
+            return
+        lease_until = lease_expiry()
+
+async def run_job(job: dict):
+    async def progress(fraction: float):
+        # Also the cancellation point for jobs cancelled from another worker
+        result = await db.jobs.update_one(
+            lease_filter(job),
+            {"$set": {
+                "progress": round(fraction * 100),
+                "lease_until": lease_expiry(),
+                "updated_at": datetime.now(timezone.utc).isoformat()
+            }}
+        )
+        if result.matched_count == 0:
+            raise JobCancelled()
+
+    if job['attempts'] > job['max_attempts']:
+        # Reclaimed after its worker died during the last attempt
+        await db.jobs.update_one(lease_filter(job), {"$set": {
+            "status": "Failed",
+            "error": "Worker stopped during the last attempt",
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }})
+        return
+
+    handler = job_handlers().get(job['type'])
+    try:
+        if handler is None:
+            raise ValueError(f"Unknown job type: {job['type']}")
+        result = await handler(job, progress)
+        updates = {"status": "Completed", "progress": 100, "result": result, "error": None}
+    except (JobCancelled, asyncio.CancelledError):
+        return
+    except Exception as e:
+        logger.exception("Job %s (%s) failed", job['id'], job['type'])
+        updates = {"status": "Failed", "error": str(e)}
+        if handler is not None and job['attempts'] < job['max_attempts']:
+            retry_at = datetime.now(timezone.utc) + timedelta(seconds=JOB_RETRY_DELAY_SECONDS * job['attempts'])
+            updates = {"status": "Queued", "error": str(e), "run_after": retry_at.isoformat()}
+    updates["updated_at"] = datetime.now(timezone.utc).isoformat()
+    await db.jobs.update_one(lease_filter(job), {"$set": updates})
+
+async def job_worker():
+    while True:
+        try:
+            job = await claim_job()
+        except Exception:
+            logger.exception("Could not claim a job")
+            await asyncio.sleep(JOB_POLL_SECONDS)
+            continue
+        if job is None:
+            job_wakeup.clear()
+            try:
+                await asyncio.wait_for(job_wakeup.wait(), JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        # Run the job as its own task so cancelling it leaves the worker alive
+        task = asyncio.create_task(run_job(job))
+        heartbeat = asyncio.create_task(renew_lease(job, task))
+        running_jobs[job['id']] = task
+        try:
+            await asyncio.wait({task})
+        finally:
+            heartbeat.cancel()
+            running_jobs.pop(job['id'], None)
+
+def start_job_workers():
+    for _ in range(JOB_WORKERS):
+        job_worker_tasks.append(asyncio.create_task(job_worker()))
+
+async def stop_job_workers():
+    global job_wakeup, process_pool
+    for task in job_worker_tasks + list(running_jobs.values()):
+        task.cancel()
+    job_worker_tasks.clear()
+    running_jobs.clear()
+    if process_pool is not None:
+        process_pool.shutdown(wait=False, cancel_futures=True)
+        process_pool = None
+    # The event is bound to this loop once waited on; a later startup gets a fresh one
+    job_wakeup = asyncio.Event()
+
+@api_router.get("/jobs/{job_id}")
+async def get_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    job = await db.jobs.find_one({"id": job_id}, {"_id": 0, "params": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if current_user['role'] != 'hr' and job['created_by'] != current_user['id']:
+        raise HTTPException(status_code=403, detail="Access denied")
+    return job
+
+@api_router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    job = await db.jobs.find_one({"id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if current_user['role'] != 'hr' and job['created_by'] != current_user['id']:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    result = await db.jobs.update_one(
+        {"id": job_id, "status": {"$in": ["Queued", "Running"]}},
+        {"$set": {"status": "Cancelled", "updated_at": datetime.now(timezone.utc).isoformat()}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=400, detail=f"Job is already {job['status'].lower()}")
+    
+    task = running_jobs.get(job_id)
+    if task:
+        task.cancel()
+    return {"message": "Job cancelled successfully"}
 
 # Configure logging
 logging.basicConfig(
@@ -784,6 +1683,71 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
+startup_tasks: set = set()
+
+async def ensure_indexes():
+    await db.jobs.create_index("id", unique=True)
+    await db.jobs.create_index([("status", 1), ("run_after", 1), ("created_at", 1)])
+    await db.jobs.create_index([("status", 1), ("lease_until", 1)])
+    await db.payslips.create_index("id", unique=True)
+    # Per-user date range reads and the archive run's (user_id, date) scan
+    await db.attendance.create_index([("user_id", 1), ("date", 1)])
+    await db.leaves.create_index([("user_id", 1), ("start_date", 1)])
+    for archive in (db.attendance_archive, db.leaves_archive):
+        await archive.create_index("id", unique=True)
+        await archive.create_index([("user_id", 1), ("month", 1)])
+    await db.avatars.create_index("id", unique=True)
+
+def log_background_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Background startup task failed", exc_info=future.exception())
+
+async def connect_db():
+    global client, db
+    # Every app built by create_app() shares this module's state, so only
+    # the first startup connects and starts the job workers
+    if client is not None:
+        return
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    # Neither warm-up nor index builds need to finish before the first request
+    prewarm = asyncio.get_running_loop().run_in_executor(None, prewarm_auth)
+    prewarm.add_done_callback(log_background_failure)
+    indexes = asyncio.create_task(ensure_indexes())
+    indexes.add_done_callback(log_background_failure)
+    startup_tasks.add(indexes)
+    indexes.add_done_callback(startup_tasks.discard)
+    start_job_workers()
+
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    global client, db
+    await stop_job_workers()
+    for task in list(startup_tasks):
+        task.cancel()
+    if client is not None:
+        client.close()
+    # Reset so the next startup (e.g. an app rebuilt by create_app) connects again
+    client = None
+    db = None
+
+def create_app() -> FastAPI:
+    """Build the ASGI app. Run with ``uvicorn --factory server:create_app``."""
+    app = FastAPI()
+
+    # Include the router in the main app
+    app.include_router(api_router)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    app.add_event_handler("startup", connect_db)
+    app.add_event_handler("shutdown", shutdown_db_client)
+    return app
+
+# Keeps ``uvicorn server:app`` working; building the app is cheap, connecting happens on startup
+app = create_app()
\ No newline at end of file
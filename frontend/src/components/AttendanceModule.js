@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
+import { useLiveEvents } from '../hooks/use-live-events';
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
@@ -21,6 +22,13 @@ const AttendanceModule = ({ user, token }) => {
     fetchAttendanceData();
   }, []);
 
+  // Only leave approvals come from someone else; our own actions refetch below
+  useLiveEvents(token, (type, data) => {
+    if (type === 'leave.updated' && data.user_id === user.id) {
+      setLeaves((prev) => prev.map((l) => (l.id === data.id ? data : l)));
+    }
+  });
+
   const fetchAttendanceData = async () => {
     try {
       const headers = { Authorization: `Bearer ${token}` };
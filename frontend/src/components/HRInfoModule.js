@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
+import { assetUrl } from '../lib/utils';
 import '../styles/HRInfo.css';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
@@ -49,7 +50,7 @@ const HRInfoModule = ({ user, token }) => {
               <div className="hr-card-header">
                 <div className="hr-avatar-large">
                   {hr.profile_picture ? (
-                    <img src={hr.profile_picture} alt={hr.full_name} />
+                    <img src={assetUrl(hr.profile_picture)} alt={hr.full_name} />
                   ) : (
                     <span>{hr.full_name.charAt(0)}</span>
                   )}
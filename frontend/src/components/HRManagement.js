@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
+import { assetUrl } from '../lib/utils';
 import '../styles/HRManagement.css';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
@@ -181,7 +182,7 @@ const HRManagement = ({ token }) => {
               >
                 <div className="user-avatar-large">
                   {user.profile_picture ? (
-                    <img src={user.profile_picture} alt={user.full_name} />
+                    <img src={assetUrl(user.profile_picture)} alt={user.full_name} />
                   ) : (
                     <span>{user.full_name.charAt(0)}</span>
                   )}
@@ -208,7 +209,7 @@ const HRManagement = ({ token }) => {
           <div className="user-header">
             <div className="user-avatar-xl">
               {selectedUser.profile_picture ? (
-                <img src={selectedUser.profile_picture} alt={selectedUser.full_name} />
+                <img src={assetUrl(selectedUser.profile_picture)} alt={selectedUser.full_name} />
               ) : (
                 <span>{selectedUser.full_name.charAt(0)}</span>
               )}
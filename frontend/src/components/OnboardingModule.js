@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
+import { useLiveEvents } from '../hooks/use-live-events';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -12,6 +13,12 @@ const OnboardingModule = ({ user, token }) => {
     fetchOnboarding();
   }, []);
 
+  useLiveEvents(token, (type, data) => {
+    if (type === 'onboarding.updated' && data.user_id === user.id) {
+      setOnboarding(data);
+    }
+  });
+
   const fetchOnboarding = async () => {
     try {
       const headers = { Authorization: `Bearer ${token}` };
@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
+import { useLiveEvents } from '../hooks/use-live-events';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -12,6 +13,14 @@ const PayrollModule = ({ user, token }) => {
     fetchPayroll();
   }, []);
 
+  useLiveEvents(token, (type, data) => {
+    if (type !== 'payment.added' || data.user_id !== user.id) return;
+    setPayroll((prev) => prev && prev.id && ({
+      ...prev,
+      payment_history: [...(prev.payment_history || []), data.payment]
+    }));
+  });
+
   const fetchPayroll = async () => {
     try {
       const headers = { Authorization: `Bearer ${token}` };
@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
+import { useLiveEvents } from '../hooks/use-live-events';
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
@@ -17,6 +18,11 @@ const PerformanceModule = ({ user, token }) => {
     fetchPerformanceData();
   }, []);
 
+  useLiveEvents(token, (type, data) => {
+    if (type !== 'task.updated' || data.user_id !== user.id) return;
+    setTasks((prev) => prev.map((t) => (t.id === data.id ? data : t)));
+  });
+
   const fetchPerformanceData = async () => {
     try {
       const headers = { Authorization: `Bearer ${token}` };
@@ -78,7 +84,7 @@ const PerformanceModule = ({ user, token }) => {
     try {
       const headers = { Authorization: `Bearer ${token}` };
       await axios.put(`${API}/performance/task/update/${taskId}`, { status }, { headers });
-      fetchPerformanceData();
+      setTasks((prev) => prev.map((t) => (t.id === taskId ? { ...t, status } : t)));
     } catch (error) {
       alert('Failed to update task');
     }
@@ -0,0 +1,93 @@
+import { useEffect, useRef } from 'react';
+import axios from 'axios';
+
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
+
+const EVENT_TYPES = [
+  'user.created',
+  'leave.updated',
+  'task.updated',
+  'payment.added',
+  'onboarding.updated',
+  'attendance.checkin'
+];
+const RECONNECT_DELAY_MS = 5000;
+
+// One EventSource is shared by every component that subscribes, so opening
+// several modules does not open several connections to the server.
+let source = null;
+let sourceToken = null;
+let reconnectTimer = null;
+// Bumped on every (re)connect and disconnect, so a stream token request that
+// resolves after its connection was superseded does not open a second stream
+let generation = 0;
+const listeners = new Set();
+
+const dispatch = (type) => (event) => {
+  const data = JSON.parse(event.data);
+  listeners.forEach((listener) => listener(type, data));
+};
+
+const scheduleReconnect = (token) => {
+  clearTimeout(reconnectTimer);
+  reconnectTimer = setTimeout(() => {
+    if (sourceToken === token && listeners.size > 0) openStream(token, ++generation);
+  }, RECONNECT_DELAY_MS);
+};
+
+const openStream = async (token, connectGeneration) => {
+  try {
+    // The stream URL carries a short-lived stream token rather than the session token
+    const headers = { Authorization: `Bearer ${token}` };
+    const response = await axios.post(`${API}/events/token`, {}, { headers });
+    if (connectGeneration !== generation) return;
+    if (source) source.close();
+
+    const stream = new EventSource(`${API}/events/stream?token=${encodeURIComponent(response.data.token)}`);
+    EVENT_TYPES.forEach((type) => stream.addEventListener(type, dispatch(type)));
+    stream.onerror = () => {
+      // The browser retries dropped connections by itself, but gives up on a
+      // rejected one (expired stream token, 429/503), which needs a new token
+      if (stream.readyState === EventSource.CLOSED) scheduleReconnect(token);
+    };
+    source = stream;
+  } catch (error) {
+    if (connectGeneration === generation) scheduleReconnect(token);
+  }
+};
+
+const connect = (token) => {
+  if (sourceToken === token) return;
+  if (source) source.close();
+  source = null;
+  sourceToken = token;
+  openStream(token, ++generation);
+};
+
+const disconnectIfIdle = () => {
+  if (listeners.size > 0) return;
+  generation += 1;
+  clearTimeout(reconnectTimer);
+  if (source) source.close();
+  source = null;
+  sourceToken = null;
+};
+
+function useLiveEvents(token, handler) {
+  const handlerRef = useRef(handler);
+  handlerRef.current = handler;
+
+  useEffect(() => {
+    if (!token) return undefined;
+    const listener = (type, data) => handlerRef.current(type, data);
+    listeners.add(listener);
+    connect(token);
+    return () => {
+      listeners.delete(listener);
+      disconnectIfIdle();
+    };
+  }, [token]);
+}
+
+export { useLiveEvents };
@@ -4,3 +4,8 @@ import { twMerge } from "tailwind-merge"
 export function cn(...inputs) {
   return twMerge(clsx(inputs));
 }
+
+// Backend-served assets (e.g. avatars) come back as "/api/..." paths
+export function assetUrl(url) {
+  return url && url.startsWith('/') ? `${process.env.REACT_APP_BACKEND_URL}${url}` : url;
+}
@@ -1,6 +1,8 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useAuth } from '../context/AuthContext';
+import { useLiveEvents } from '../hooks/use-live-events';
+import { assetUrl } from '../lib/utils';
 import axios from 'axios';
 import { LineChart, Line, BarChart, Bar, PieChart, Pie, Cell, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts';
 import OnboardingModule from '../components/OnboardingModule';
@@ -29,6 +31,21 @@ const Dashboard = () => {
     fetchData();
   }, []);
 
+  useLiveEvents(token, (type, data) => {
+    if (type !== 'user.created') return;
+    setUsers((prev) => (prev.some((u) => u.id === data.id) ? prev : [...prev, data]));
+    setStats((prev) => {
+      if (!prev || prev.total_users === undefined || data.role === 'hr') return prev;
+      return {
+        ...prev,
+        total_users: prev.total_users + 1,
+        total_interns: prev.total_interns + (data.role === 'intern' ? 1 : 0),
+        total_employees: prev.total_employees + (data.role === 'employee' ? 1 : 0),
+        recent_activity: [data, ...(prev.recent_activity || [])].slice(0, 5)
+      };
+    });
+  });
+
   const fetchData = async () => {
     try {
       const headers = { Authorization: `Bearer ${token}` };
@@ -232,7 +249,7 @@ const Dashboard = () => {
           <div className="header-actions">
             <div className="user-avatar" data-testid="user-avatar">
               {user.profile_picture ? (
-                <img src={user.profile_picture} alt="Profile" />
+                <img src={assetUrl(user.profile_picture)} alt="Profile" />
               ) : (
                 <span>{user.full_name.charAt(0)}</span>
               )}
@@ -497,7 +514,7 @@ const InternDashboard = ({ user, handlePhotoUpload, handleResumeUpload, uploadin
           <div className="profile-header">
             <div className="profile-avatar-large">
               {user.profile_picture ? (
-                <img src={user.profile_picture} alt="Profile" />
+                <img src={assetUrl(user.profile_picture)} alt="Profile" />
               ) : (
                 <span>{user.full_name.charAt(0)}</span>
               )}
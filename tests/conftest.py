@@ -0,0 +1,124 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+BACKEND_ENV = {
+    "MONGO_URL": os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+    "DB_NAME": os.environ.get("DB_NAME", "hr_management_test"),
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def backend_server():
+    """Start backends with ``uvicorn --factory server:create_app``.
+
+    Calling the fixture returns ``(base_url, seconds_to_first_200)``, where
+    the time runs from process launch to the first 200 from ``GET /api/``.
+    """
+    processes = []
+
+    def start(env=None, timeout=30):
+        port = free_port()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "--factory", "server:create_app", "--port", str(port)],
+            cwd=BACKEND_DIR,
+            env={**os.environ, **BACKEND_ENV, **(env or {})},
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        started = time.perf_counter()
+        processes.append(process)
+        base_url = f"http://127.0.0.1:{port}"
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"{base_url}/api/", timeout=1) as response:
+                    if response.status == 200:
+                        return base_url, time.perf_counter() - started
+            except OSError:
+                if process.poll() is not None:
+                    pytest.fail("backend exited during startup")
+                time.sleep(0.02)
+        pytest.fail("backend did not answer GET /api/ in time")
+
+    yield start
+    for process in processes:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def mongo_reachable():
+    import pymongo
+
+    client = pymongo.MongoClient(BACKEND_ENV["MONGO_URL"], serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+        return True
+    except pymongo.errors.PyMongoError:
+        return False
+    finally:
+        client.close()
+
+
+@pytest.fixture(scope="session")
+def real_mongo():
+    return mongo_reachable()
+
+
+@pytest.fixture
+def run_with_db(real_mongo):
+    """Run ``scenario(db)`` to completion with ``server.db`` set to a throwaway database.
+
+    Uses the MongoDB at MONGO_URL when it is reachable, otherwise mongomock_motor.
+    """
+    pytest.importorskip("fastapi")
+    import server
+
+    def run(scenario):
+        async def main():
+            if real_mongo:
+                from motor.motor_asyncio import AsyncIOMotorClient
+                client = AsyncIOMotorClient(BACKEND_ENV["MONGO_URL"])
+            else:
+                mongomock_motor = pytest.importorskip("mongomock_motor")
+                client = mongomock_motor.AsyncMongoMockClient()
+            name = f"hr_test_{uuid.uuid4().hex[:8]}"
+            saved = server.client, server.db, server.job_wakeup
+            server.client, server.db, server.job_wakeup = client, client[name], asyncio.Event()
+            try:
+                return await scenario(server.db)
+            finally:
+                await client.drop_database(name)
+                server.client, server.db, server.job_wakeup = saved
+
+        return asyncio.run(main())
+
+    run.real_mongo = real_mongo
+    return run
+
+
+@pytest.fixture
+def process_pool():
+    """Shut down the job process pool that a test started through ``run_in_process``."""
+    yield
+    import server
+
+    if server.process_pool is not None:
+        server.process_pool.shutdown()
+        server.process_pool = None
@@ -0,0 +1,140 @@
+"""Attendance archive: watermark, read-through and whole-history summaries."""
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("motor")
+
+import server
+
+HR = {"id": "hr-1", "role": "hr"}
+USER_ID = "emp-1"
+
+
+def attendance(date, status="Present", hours=8):
+    return {"id": str(uuid.uuid4()), "user_id": USER_ID, "date": date, "status": status, "hours_worked": hours}
+
+
+def leave(start_date, status="Approved"):
+    return {"id": str(uuid.uuid4()), "user_id": USER_ID, "start_date": start_date, "end_date": start_date, "status": status}
+
+
+async def noop_progress(fraction):
+    pass
+
+
+async def seed(db):
+    today = datetime.now(timezone.utc).date().isoformat()
+    records = [
+        attendance("2020-01-06"),
+        attendance("2020-01-07", status="Absent", hours=0),
+        attendance("2020-02-03", hours=4.5),
+        attendance(today),
+    ]
+    leaves = [leave("2020-01-20"), leave("2020-02-10", status="Rejected"), leave("2020-03-02", status="Pending")]
+    await db.attendance.insert_many([dict(r) for r in records])
+    await db.leaves.insert_many([dict(l) for l in leaves])
+    return records, leaves
+
+
+def test_range_needs_archive():
+    assert not server.range_needs_archive(None, None)
+    assert not server.range_needs_archive("2020-01-01", None)
+    assert server.range_needs_archive(None, "2021-01-01")
+    assert server.range_needs_archive("2020-12-31", "2021-01-01")
+    assert not server.range_needs_archive("2021-01-01", "2021-01-01")
+
+
+def test_merge_records_prefers_hot_copy():
+    archived = [{"id": "a", "v": "old"}, {"id": "b", "v": "old"}]
+    hot = [{"id": "b", "v": "hot"}, {"id": "c", "v": "hot"}]
+    assert server.merge_records(archived, hot) == [{"id": "a", "v": "old"}, {"id": "b", "v": "hot"}, {"id": "c", "v": "hot"}]
+
+
+def test_archive_run_moves_settled_records_and_raises_watermark(run_with_db, monkeypatch):
+    async def scenario(db):
+        records, leaves = await seed(db)
+        before = await server.get_attendance_overview(USER_ID, current_user=HR)
+        assert await server.archived_before() is None
+
+        result = await server.run_attendance_archive({"id": "job-1"}, noop_progress)
+        cutoff = result['cutoff']
+        assert result['attendance_archived'] == 3
+        # The pending leave stays hot even though it is old
+        assert result['leaves_archived'] == 2
+        assert await server.archived_before() == cutoff
+        assert await db.attendance.count_documents({}) == 1
+        assert [l['id'] for l in await db.leaves.find({}).to_list(None)] == [leaves[2]['id']]
+
+        bucket = await db.attendance_archive.find_one({"id": f"{USER_ID}:2020-01"})
+        assert bucket['summary'] == {"total_days": 2, "present_days": 1, "total_hours": 8}
+        assert sorted(bucket['ids']) == sorted(r['id'] for r in records[:2])
+
+        # Whole-history stats come out the same from the summaries
+        after = await server.get_attendance_overview(USER_ID, current_user=HR)
+        for key in ("total_days", "present_days", "leave_taken", "total_hours", "attendance_percentage"):
+            assert after[key] == before[key]
+        assert [r['id'] for r in after['attendance_records']] == [r['id'] for r in records[2:]]
+
+        # A date range reads through to the archived records
+        january = await server.get_attendance_overview(USER_ID, "2020-01-01", "2020-01-31", current_user=HR)
+        assert sorted(r['id'] for r in january['attendance_records']) == sorted(r['id'] for r in records[:2])
+        assert january['leave_taken'] == 1
+
+        # Archiving less later does not lower the watermark
+        monkeypatch.setattr(server, "ARCHIVE_AFTER_DAYS", server.ARCHIVE_AFTER_DAYS * 20)
+        again = await server.run_attendance_archive({"id": "job-2"}, noop_progress)
+        assert again['cutoff'] < cutoff
+        assert await server.archived_before() == cutoff
+        assert (await server.get_attendance_overview(USER_ID, current_user=HR))['total_days'] == before['total_days']
+
+    run_with_db(scenario)
+
+
+def test_overview_does_not_double_count_records_mid_archive(run_with_db):
+    async def scenario(db):
+        records, _ = await seed(db)
+        before = await server.get_attendance_overview(USER_ID, current_user=HR)
+        await server.run_attendance_archive({"id": "job-1"}, noop_progress)
+        watermark = await server.archived_before()
+
+        # As if the bucket was written but the hot copies were not deleted yet
+        await db.attendance.insert_many([dict(r) for r in records[:3]])
+        hot = await db.attendance.find({}, {"_id": 0}).to_list(None)
+        kept = await server.drop_archived(db.attendance_archive, USER_ID, hot, "date", watermark)
+        assert [r['id'] for r in kept] == [records[3]['id']]
+
+        during = await server.get_attendance_overview(USER_ID, current_user=HR)
+        assert during['total_days'] == before['total_days']
+        assert during['present_days'] == before['present_days']
+        assert during['total_hours'] == before['total_hours']
+
+        january = await server.get_attendance_overview(USER_ID, "2020-01-01", "2020-01-31", current_user=HR)
+        assert january['total_days'] == 2
+
+    run_with_db(scenario)
+
+
+def test_leaves_read_through_without_a_range(run_with_db):
+    async def scenario(db):
+        _, leaves = await seed(db)
+        await server.run_attendance_archive({"id": "job-1"}, noop_progress)
+
+        listed = await server.get_leaves(USER_ID, current_user=HR)
+        assert sorted(l['id'] for l in listed) == sorted(l['id'] for l in leaves)
+
+        february = await server.get_leaves(USER_ID, "2020-02-01", "2020-02-29", current_user=HR)
+        assert [l['id'] for l in february] == [leaves[1]['id']]
+
+    run_with_db(scenario)
+
+
+def test_hot_collections_are_indexed_for_per_user_reads(run_with_db):
+    async def scenario(db):
+        await server.ensure_indexes()
+        assert "user_id_1_date_1" in await db.attendance.index_information()
+        assert "user_id_1_start_date_1" in await db.leaves.index_information()
+
+    run_with_db(scenario)
@@ -0,0 +1,60 @@
+"""Avatar uploads: rejected inputs become 400s rather than 500s."""
+import struct
+import zlib
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("motor")
+pytest.importorskip("PIL")
+
+import server
+from fastapi import HTTPException
+
+USER_ID = "emp-1"
+
+
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def png_header(width, height):
+    """A PNG with no pixel data: a few bytes, but it claims width x height pixels."""
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + png_chunk(b"IHDR", ihdr) + png_chunk(b"IEND", b"")
+
+
+async def upload(db, contents):
+    await db.users.insert_one({"id": USER_ID, "role": "employee", "profile_picture": None})
+    with pytest.raises(HTTPException) as rejected:
+        await server.store_avatar(USER_ID, contents)
+    assert rejected.value.status_code == 400
+    assert await db.avatars.count_documents({}) == 0
+    assert (await db.users.find_one({"id": USER_ID}))['profile_picture'] is None
+    return rejected.value
+
+
+def test_decompression_bomb_is_a_value_error():
+    with pytest.raises(ValueError):
+        server.render_avatar_variants(png_header(20000, 20000))
+
+
+def test_store_avatar_rejects_decompression_bomb(run_with_db, process_pool):
+    async def scenario(db):
+        rejected = await upload(db, png_header(20000, 20000))
+        assert rejected.detail == "Could not read image file"
+
+    run_with_db(scenario)
+
+
+def test_store_avatar_rejects_oversized_upload(run_with_db, monkeypatch):
+    def render(contents):
+        raise AssertionError("oversized uploads must not reach the process pool")
+
+    monkeypatch.setattr(server, "render_avatar_variants", render)
+
+    async def scenario(db):
+        rejected = await upload(db, b"\0" * (server.MAX_AVATAR_BYTES + 1))
+        assert rejected.detail == "Image file is too large"
+
+    run_with_db(scenario)
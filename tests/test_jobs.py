@@ -0,0 +1,251 @@
+"""Background job runner: claiming, leases, retries, cancellation and access."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("motor")
+
+import server
+from fastapi import HTTPException
+
+HR = {"id": "hr-1", "role": "hr"}
+EMPLOYEE = {"id": "emp-1", "role": "employee"}
+OTHER_EMPLOYEE = {"id": "emp-2", "role": "employee"}
+
+
+def ago(seconds):
+    return (datetime.now(timezone.utc) - timedelta(seconds=seconds)).isoformat()
+
+
+@pytest.fixture
+def handlers(monkeypatch):
+    registry = {}
+    monkeypatch.setattr(server, "job_handlers", lambda: registry)
+    return registry
+
+
+def test_claim_job_takes_oldest_and_sets_lease(run_with_db):
+    async def scenario(db):
+        first = await server.enqueue_job("test.noop", {}, HR)
+        await server.enqueue_job("test.noop", {}, HR)
+        await db.jobs.update_one({"id": first['id']}, {"$set": {"created_at": ago(10)}})
+
+        job = await server.claim_job()
+        assert job['id'] == first['id']
+        assert job['status'] == "Running"
+        assert job['attempts'] == 1
+        assert job['lease_id'] and job['lease_until'] > datetime.now(timezone.utc).isoformat()
+        assert '_id' not in job
+
+    run_with_db(scenario)
+
+
+def test_claim_job_skips_future_and_live_leases_but_reclaims_expired(run_with_db):
+    async def scenario(db):
+        waiting = await server.enqueue_job("test.noop", {}, HR)
+        await db.jobs.update_one({"id": waiting['id']}, {"$set": {
+            "run_after": (datetime.now(timezone.utc) + timedelta(minutes=5)).isoformat()
+        }})
+        running = await server.enqueue_job("test.noop", {}, HR)
+        claimed = await server.claim_job()
+        assert claimed['id'] == running['id']
+
+        # Still leased, and the other job is not due yet
+        assert await server.claim_job() is None
+
+        await db.jobs.update_one({"id": running['id']}, {"$set": {"lease_until": ago(1)}})
+        reclaimed = await server.claim_job()
+        assert reclaimed['id'] == running['id']
+        assert reclaimed['attempts'] == 2
+        assert reclaimed['lease_id'] != claimed['lease_id']
+
+        # The first worker lost the lease, so its writes no longer land
+        result = await db.jobs.update_one(server.lease_filter(claimed), {"$set": {"status": "Completed"}})
+        assert result.matched_count == 0
+
+    run_with_db(scenario)
+
+
+def test_run_job_completes_with_result_and_progress(run_with_db, handlers):
+    async def handler(job, progress):
+        await progress(0.5)
+        stored = await server.db.jobs.find_one({"id": job['id']})
+        assert stored['progress'] == 50
+        return {"echo": job['params']['value']}
+
+    handlers["test.echo"] = handler
+
+    async def scenario(db):
+        queued = await server.enqueue_job("test.echo", {"value": 7}, HR)
+        await server.run_job(await server.claim_job())
+        job = await db.jobs.find_one({"id": queued['id']})
+        assert job['status'] == "Completed"
+        assert job['progress'] == 100
+        assert job['result'] == {"echo": 7}
+
+    run_with_db(scenario)
+
+
+def test_failed_job_retries_with_backoff_then_fails(run_with_db, handlers):
+    calls = []
+
+    async def handler(job, progress):
+        calls.append(job['attempts'])
+        raise RuntimeError("boom")
+
+    handlers["test.fail"] = handler
+
+    async def scenario(db):
+        queued = await server.enqueue_job("test.fail", {}, HR)
+        for attempt in range(1, server.JOB_MAX_ATTEMPTS + 1):
+            before = datetime.now(timezone.utc)
+            await server.run_job(await server.claim_job())
+            job = await db.jobs.find_one({"id": queued['id']})
+            assert job['error'] == "boom"
+            if attempt < server.JOB_MAX_ATTEMPTS:
+                assert job['status'] == "Queued"
+                delay = datetime.fromisoformat(job['run_after']) - before
+                assert delay >= timedelta(seconds=server.JOB_RETRY_DELAY_SECONDS * attempt)
+                assert await server.claim_job() is None
+                await db.jobs.update_one({"id": queued['id']}, {"$set": {"run_after": ago(1)}})
+            else:
+                assert job['status'] == "Failed"
+        assert calls == [1, 2, 3]
+
+    run_with_db(scenario)
+
+
+def test_unknown_job_type_fails_without_retry(run_with_db, handlers):
+    async def scenario(db):
+        queued = await server.enqueue_job("test.missing", {}, HR)
+        await server.run_job(await server.claim_job())
+        job = await db.jobs.find_one({"id": queued['id']})
+        assert job['status'] == "Failed"
+        assert job['attempts'] == 1
+
+    run_with_db(scenario)
+
+
+def test_job_reclaimed_after_last_attempt_is_failed(run_with_db, handlers):
+    calls = []
+
+    async def handler(job, progress):
+        calls.append(job)
+
+    handlers["test.noop"] = handler
+
+    async def scenario(db):
+        queued = await server.enqueue_job("test.noop", {}, HR)
+        # The worker died while running the last allowed attempt
+        await db.jobs.update_one({"id": queued['id']}, {"$set": {
+            "status": "Running", "attempts": server.JOB_MAX_ATTEMPTS, "lease_until": ago(1)
+        }})
+        job = await server.claim_job()
+        assert job['attempts'] == server.JOB_MAX_ATTEMPTS + 1
+        await server.run_job(job)
+        stored = await db.jobs.find_one({"id": queued['id']})
+        assert stored['status'] == "Failed"
+        assert stored['error'] == "Worker stopped during the last attempt"
+        assert calls == []
+
+    run_with_db(scenario)
+
+
+def test_cancelled_job_stops_at_next_progress(run_with_db, handlers):
+    reached = []
+
+    async def handler(job, progress):
+        await progress(0.1)
+        await server.cancel_job(job['id'], HR)
+        try:
+            await progress(0.2)
+        except server.JobCancelled:
+            reached.append("cancelled")
+            raise
+        reached.append("after cancel")
+
+    handlers["test.slow"] = handler
+
+    async def scenario(db):
+        queued = await server.enqueue_job("test.slow", {}, HR)
+        await server.run_job(await server.claim_job())
+        job = await db.jobs.find_one({"id": queued['id']})
+        assert job['status'] == "Cancelled"
+        assert job['progress'] == 10
+        assert reached == ["cancelled"]
+
+    run_with_db(scenario)
+
+
+def test_cancel_job_rejects_finished_and_foreign_jobs(run_with_db, handlers):
+    async def handler(job, progress):
+        return None
+
+    handlers["test.noop"] = handler
+
+    async def scenario(db):
+        queued = await server.enqueue_job("test.noop", {}, EMPLOYEE)
+        with pytest.raises(HTTPException) as denied:
+            await server.cancel_job(queued['id'], OTHER_EMPLOYEE)
+        assert denied.value.status_code == 403
+
+        await server.run_job(await server.claim_job())
+        with pytest.raises(HTTPException) as finished:
+            await server.cancel_job(queued['id'], EMPLOYEE)
+        assert finished.value.status_code == 400
+        assert (await db.jobs.find_one({"id": queued['id']}))['status'] == "Completed"
+
+        with pytest.raises(HTTPException) as missing:
+            await server.cancel_job("no-such-job", HR)
+        assert missing.value.status_code == 404
+
+    run_with_db(scenario)
+
+
+def test_get_job_access_control(run_with_db):
+    async def scenario(db):
+        queued = await server.enqueue_job("test.noop", {"secret": "params"}, EMPLOYEE)
+
+        job = await server.get_job(queued['id'], EMPLOYEE)
+        assert job['id'] == queued['id']
+        assert 'params' not in job and '_id' not in job
+        assert (await server.get_job(queued['id'], HR))['id'] == queued['id']
+
+        with pytest.raises(HTTPException) as denied:
+            await server.get_job(queued['id'], OTHER_EMPLOYEE)
+        assert denied.value.status_code == 403
+
+        with pytest.raises(HTTPException) as missing:
+            await server.get_job("no-such-job", HR)
+        assert missing.value.status_code == 404
+
+    run_with_db(scenario)
+
+
+def test_job_worker_runs_queued_jobs(run_with_db, handlers):
+    async def handler(job, progress):
+        await progress(0.5)
+        return {"done": job['params']['n']}
+
+    handlers["test.count"] = handler
+
+    async def scenario(db):
+        worker = asyncio.create_task(server.job_worker())
+        try:
+            # The first job is picked up after the worker idles, through the wakeup event
+            await asyncio.sleep(0.05)
+            queued = [await server.enqueue_job("test.count", {"n": n}, HR) for n in range(3)]
+            for _ in range(100):
+                jobs = await db.jobs.find({"status": "Completed"}).to_list(10)
+                if len(jobs) == len(queued):
+                    break
+                await asyncio.sleep(0.05)
+            assert sorted(job['result']['done'] for job in jobs) == [0, 1, 2]
+            assert server.running_jobs == {}
+        finally:
+            worker.cancel()
+            await asyncio.gather(worker, return_exceptions=True)
+
+    run_with_db(scenario)
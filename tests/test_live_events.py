@@ -0,0 +1,107 @@
+"""Benchmark: request volume of the live events stream versus dashboard polling."""
+import asyncio
+import time
+import uuid
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("motor")
+
+import server
+
+CLIENTS = {"hr": 10, "employee": 90, "intern": 200}
+SESSION_SECONDS = 8 * 60 * 60
+POLL_SECONDS = 30
+REQUESTS_PER_POLL = 2  # /dashboard/stats + /users, as Dashboard.fetchData
+MUTATIONS = 2000
+PUBLISH_BUDGET_MS = 5.0
+
+
+def make_users():
+    users = []
+    for role, count in CLIENTS.items():
+        users.extend({"id": str(uuid.uuid4()), "role": role} for _ in range(count))
+    return users
+
+
+def drain(subscribers, delivered):
+    for subscriber in subscribers:
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+            delivered[subscriber.user['id']] += 1
+
+
+def test_event_stream_replaces_polling():
+    users = make_users()
+    subscribers = [server.event_bus.subscribe(user) for user in users]
+    delivered = {user['id']: 0 for user in users}
+    expected_for_intern = {user['id']: 0 for user in users}
+    try:
+        publish_seconds = 0.0
+        for i in range(MUTATIONS):
+            subject = users[i % len(users)]
+            expected_for_intern[subject['id']] += 1
+            start = time.perf_counter()
+            server.event_bus.publish(
+                "task.updated",
+                {"id": str(i), "user_id": subject['id'], "status": "Completed"},
+                server.staff_or_self(subject['id'])
+            )
+            publish_seconds += time.perf_counter() - start
+            if i % 50 == 49:
+                drain(subscribers, delivered)
+        drain(subscribers, delivered)
+    finally:
+        for subscriber in subscribers:
+            server.event_bus.unsubscribe(subscriber)
+
+    assert not any(subscriber.overflowed for subscriber in subscribers)
+    # Interns only see events about themselves; staff see every event
+    for user in users:
+        expected = MUTATIONS if user['role'] != 'intern' else expected_for_intern[user['id']]
+        assert delivered[user['id']] == expected
+
+    polling_requests = len(users) * (SESSION_SECONDS // POLL_SECONDS) * REQUESTS_PER_POLL
+    stream_requests = len(users) * 2  # POST /events/token + GET /events/stream
+    mean_publish_ms = publish_seconds / MUTATIONS * 1000
+    print(
+        f"\n{len(users)} clients over {SESSION_SECONDS // 3600}h: "
+        f"polling {polling_requests} requests, stream {stream_requests} requests "
+        f"({sum(delivered.values())} deltas pushed), "
+        f"publish {mean_publish_ms:.3f} ms to {len(users)} subscribers"
+    )
+    assert stream_requests * 100 < polling_requests
+    assert mean_publish_ms < PUBLISH_BUDGET_MS
+
+
+def test_subscribe_enforces_per_user_limit():
+    user = {"id": str(uuid.uuid4()), "role": "intern"}
+    subscribers = [server.event_bus.subscribe(user) for _ in range(server.MAX_EVENT_STREAMS_PER_USER)]
+    try:
+        with pytest.raises(server.HTTPException) as excinfo:
+            server.event_bus.subscribe(user)
+        assert excinfo.value.status_code == 429
+    finally:
+        for subscriber in subscribers:
+            server.event_bus.unsubscribe(subscriber)
+
+
+def test_stream_releases_slot_when_client_drops_before_first_chunk():
+    user = {"id": str(uuid.uuid4()), "role": "intern"}
+    subscriber = server.event_bus.subscribe(user)
+
+    async def never_started():
+        yield "retry: 5000\n\n"
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        raise OSError("client went away")
+
+    response = server.EventStreamResponse(subscriber, never_started(), media_type="text/event-stream")
+    # Starlette may wrap the send error in an ExceptionGroup
+    with pytest.raises(Exception):
+        asyncio.run(response({"type": "http"}, receive, send))
+    assert subscriber not in server.event_bus.subscribers
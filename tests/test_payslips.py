@@ -0,0 +1,160 @@
+"""Payslip generation: PDF rendering, account masking, reuse and the payment_history update."""
+import base64
+import uuid
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("motor")
+
+import server
+from fastapi import HTTPException
+
+HR = {"id": "hr-1", "role": "hr"}
+PERIOD = "2024-03"
+
+
+@pytest.fixture
+def payroll_writes(monkeypatch, run_with_db):
+    """Record every db.payroll.bulk_write.
+
+    mongomock has no array_filters, so there each write is applied through the
+    equivalent positional update; against a real MongoDB it goes through as is.
+    """
+    calls = []
+    collection_type = None
+
+    def install(db):
+        nonlocal collection_type
+        collection_type = type(db.payroll)
+        original = collection_type.bulk_write
+
+        async def bulk_write(self, operations, *args, **kwargs):
+            if self.name != "payroll":
+                return await original(self, operations, *args, **kwargs)
+            calls.append(list(operations))
+            if run_with_db.real_mongo:
+                return await original(self, operations, *args, **kwargs)
+            for op in operations:
+                (field, value), = op._doc["$set"].items()
+                (match, payment_id), = op._array_filters[0].items()
+                await self.update_one(
+                    {**op._filter, match.replace("payment.", "payment_history."): payment_id},
+                    {"$set": {field.replace(".$[payment].", ".$."): value}}
+                )
+
+        monkeypatch.setattr(collection_type, "bulk_write", bulk_write)
+
+    install.calls = calls
+    return install
+
+
+async def seed_payroll(db, user_id, payments, bank_account="123456789012"):
+    await db.users.insert_one({
+        "id": user_id, "full_name": f"Employee {user_id}", "employee_id": f"E-{user_id}", "role": "employee"
+    })
+    await db.payroll.insert_one({
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "salary_type": "Monthly",
+        "amount": 5000,
+        "payment_schedule": "Monthly",
+        "bank_account": bank_account,
+        "payment_history": payments
+    })
+
+
+def payment(payment_date, amount=5000):
+    return {"id": str(uuid.uuid4()), "amount": amount, "payment_date": payment_date, "status": "Paid", "slip_url": ""}
+
+
+async def noop_progress(fraction):
+    pass
+
+
+def test_render_payslip_pdf():
+    slip = {
+        "user_id": "u1", "full_name": "Ada (Lovelace)", "employee_id": None, "role": "employee",
+        "period": PERIOD, "payment_id": "p1", "payment_date": "2024-03-31", "amount": 1234.5,
+        "status": "Paid", "salary_type": "Monthly", "bank_account": "********9012"
+    }
+    pdf = server.render_payslip_pdf(slip)
+    assert pdf.startswith(b"%PDF-1.4\n") and pdf.endswith(b"%%EOF\n")
+    assert b"(Employee: Ada \\(Lovelace\\))" in pdf
+    assert b"Employee ID: -" in pdf
+    assert b"Amount: 1,234.50" in pdf
+    assert server.render_payslip_pdf(slip) == pdf
+    assert server.payslip_key(slip) == server.payslip_key(dict(reversed(list(slip.items()))))
+
+
+def test_mask_account():
+    assert server.mask_account("123456789012") == "********9012"
+    assert server.mask_account("12345678") == "****5678"
+    # Too short to show any digits
+    assert server.mask_account("1234567") == "*******"
+    assert server.mask_account("") == ""
+    assert server.mask_account(None) == ""
+
+
+def test_generate_payslips_rejects_loose_periods(run_with_db):
+    async def scenario(db):
+        for period in ["2024-1", "2024-13", "24-03", "2024-03-01"]:
+            with pytest.raises(HTTPException) as invalid:
+                await server.generate_payslips(period, HR)
+            assert invalid.value.status_code == 400
+        with pytest.raises(HTTPException) as denied:
+            await server.generate_payslips(PERIOD, {"id": "emp-1", "role": "employee"})
+        assert denied.value.status_code == 403
+        assert await db.jobs.count_documents({}) == 0
+
+        queued = await server.generate_payslips(PERIOD, HR)
+        job = await db.jobs.find_one({"id": queued['job_id']})
+        assert job['params'] == {"period": PERIOD}
+
+    run_with_db(scenario)
+
+
+def test_payslips_are_rendered_once_and_reused(run_with_db, process_pool, payroll_writes):
+    async def scenario(db):
+        payroll_writes(db)
+        march = payment("2024-03-31")
+        bad = payment("2024-03-15", amount="five thousand")
+        await seed_payroll(db, "u1", [march, bad, payment("2024-02-29")], bank_account="1234567")
+        other = payment("2024-03-31")
+        await seed_payroll(db, "u2", [other, payment("2024-11-30")])
+        await seed_payroll(db, "u3", [payment("2024-10-31")])
+        job = {"id": "job-1", "params": {"period": PERIOD}}
+
+        first = await server.run_payslip_generation(job, noop_progress)
+        assert first['payslips'] == 2
+        assert first['rendered'] == 2
+        assert first['reused'] == 0
+        assert first['skipped'] == [{"payment_id": bad['id'], "error": "Invalid amount"}]
+
+        # One bulk_write covers every payment_history entry, each targeted by id
+        assert len(payroll_writes.calls) == 1
+        operations = payroll_writes.calls[0]
+        assert len(operations) == 2
+        assert {op._array_filters[0]["payment.id"] for op in operations} == {march['id'], other['id']}
+
+        u1 = await db.payroll.find_one({"user_id": "u1"}, {"_id": 0})
+        slip_url = u1['payment_history'][0]['slip_url']
+        assert slip_url.startswith("/api/payroll/slips/")
+        assert [p['slip_url'] for p in u1['payment_history'][1:]] == ["", ""]
+
+        slip = await db.payslips.find_one({"id": slip_url.rsplit("/", 1)[1]}, {"_id": 0})
+        assert slip['user_id'] == "u1" and slip['period'] == PERIOD
+        pdf = base64.b64decode(slip['data'])
+        assert b"Bank account: *******" in pdf and b"1234567" not in pdf
+
+        second = await server.run_payslip_generation(job, noop_progress)
+        assert second['payslips'] == 2
+        assert second['rendered'] == 0
+        assert second['reused'] == 2
+        assert await db.payslips.count_documents({}) == 2
+
+        # A period queued before validation was tightened must not prefix-match 2024-10..12
+        loose = await server.run_payslip_generation({"id": "job-2", "params": {"period": "2024-1"}}, noop_progress)
+        assert loose['payslips'] == 0
+
+    run_with_db(scenario)
@@ -0,0 +1,61 @@
+"""Startup benchmark: import time and time-to-first-200 of the backend."""
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from .conftest import BACKEND_DIR, BACKEND_ENV
+
+pytest.importorskip("fastapi")
+pytest.importorskip("uvicorn")
+
+IMPORT_BUDGET_SECONDS = float(os.environ.get("STARTUP_IMPORT_BUDGET_SECONDS", "3"))
+FIRST_200_BUDGET_SECONDS = float(os.environ.get("STARTUP_FIRST_200_BUDGET_SECONDS", "5"))
+
+
+def test_import_time():
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", "import server"],
+        cwd=BACKEND_DIR,
+        env={**os.environ, **BACKEND_ENV},
+        check=True,
+    )
+    elapsed = time.perf_counter() - started
+    print(f"\nimport server: {elapsed:.2f}s")
+    assert elapsed < IMPORT_BUDGET_SECONDS
+
+
+def test_time_to_first_200(backend_server):
+    # GET /api/ does not touch Mongo, so this needs no running database
+    _, elapsed = backend_server()
+    print(f"\nfirst 200 from GET /api/: {elapsed:.2f}s")
+    assert elapsed < FIRST_200_BUDGET_SECONDS
+
+
+def test_startup_after_shutdown_reconnects(monkeypatch):
+    # No Mongo I/O happens here: Motor connects lazily and the workers are cancelled
+    import server
+
+    for key, value in BACKEND_ENV.items():
+        monkeypatch.setenv(key, value)
+
+    async def scenario():
+        await server.connect_db()
+        first_client = server.client
+        await server.shutdown_db_client()
+        assert server.client is None and server.db is None
+        assert server.process_pool is None and not server.job_worker_tasks
+
+        await server.connect_db()
+        try:
+            assert server.client is not None and server.client is not first_client
+            assert server.db.name == BACKEND_ENV["DB_NAME"]
+            assert len(server.job_worker_tasks) == server.JOB_WORKERS
+        finally:
+            await server.shutdown_db_client()
+
+    asyncio.run(scenario())
@@ -0,0 +1,128 @@
+"""Benchmark: payload size and latency of GET /api/users with 1k users with avatars.
+
+Users start with profile photos stored inline as data URLs, as before the
+thumbnail pipeline. The inline baseline is what the endpoints return for
+them; the avatar backfill then converts the photos and the list is measured
+again. Runs against the MongoDB at MONGO_URL when reachable, otherwise
+mongomock_motor.
+"""
+import base64
+import io
+import json
+import os
+import statistics
+import time
+import uuid
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("motor")
+Image = pytest.importorskip("PIL.Image")
+
+import server
+
+USERS = 1000  # including the HR user; the HR list returns at most 1000
+DISTINCT_AVATARS = 10
+AVATAR_SIDE = 160  # noisy JPEGs of this size come out around 40 KiB, a typical photo
+RUNS = 5
+LATENCY_BUDGET_SECONDS = float(os.environ.get("USERS_LATENCY_BUDGET_SECONDS", "1"))
+
+
+async def asgi_get(path, token):
+    """Send one GET through the app's full ASGI stack and return (status, body)."""
+    messages = []
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"testserver"), (b"authorization", f"Bearer {token}".encode())],
+        "client": ("127.0.0.1", 0),
+        "server": ("testserver", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await server.app(scope, receive, send)
+    body = b"".join(m.get("body", b"") for m in messages if m["type"] == "http.response.body")
+    return messages[0]["status"], body
+
+
+def make_avatar():
+    buffer = io.BytesIO()
+    Image.frombytes("RGB", (AVATAR_SIDE, AVATAR_SIDE), os.urandom(AVATAR_SIDE * AVATAR_SIDE * 3)).save(
+        buffer, "JPEG", quality=90
+    )
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def make_user(role, picture=None):
+    return {
+        "id": str(uuid.uuid4()),
+        "full_name": "Benchmark User",
+        "email": f"{uuid.uuid4().hex}@example.com",
+        "phone_number": "0000000000",
+        "role": role,
+        "date_of_birth": "1990-01-01",
+        "address": "Somewhere",
+        "preferred_language": "English",
+        "profile_picture": picture,
+        "created_at": "2026-01-01T00:00:00+00:00",
+        "resume": None,
+    }
+
+
+async def noop_progress(fraction):
+    pass
+
+
+def test_users_list_payload(run_with_db, process_pool):
+    async def scenario(db):
+        avatars = [make_avatar() for _ in range(DISTINCT_AVATARS)]
+        hr = make_user("hr")
+        users = [make_user("employee", avatars[i % DISTINCT_AVATARS]) for i in range(USERS - 1)]
+        await db.users.insert_many([hr] + users)
+        token = server.create_access_token({"sub": hr["id"], "role": "hr"})
+
+        # What the list shipped when pictures were stored inline: every user
+        # document as the API returns it, inline picture included
+        bodies = []
+        for user in [hr] + users:
+            status, body = await asgi_get(f"/api/users/{user['id']}", token)
+            assert status == 200
+            bodies.append(body)
+        inline_bytes = sum(len(body) for body in bodies) + len(bodies) + 1
+        assert json.loads(bodies[1])["profile_picture"].startswith("data:image/jpeg;base64,")
+
+        backfill = await server.run_avatar_backfill({"id": "job-1"}, noop_progress)
+        assert backfill == {"converted": USERS - 1, "failed": 0}
+
+        timings = []
+        for _ in range(RUNS):
+            started = time.perf_counter()
+            status, body = await asgi_get("/api/users", token)
+            timings.append(time.perf_counter() - started)
+            assert status == 200
+        return inline_bytes, body, statistics.median(timings)
+
+    inline_bytes, body, latency = run_with_db(scenario)
+    listed = json.loads(body)
+
+    print(
+        f"\nGET /api/users, {len(listed)} users: {len(body) / 1024:.0f} KiB in {latency * 1000:.0f} ms "
+        f"(inline pictures: {inline_bytes / 1024:.0f} KiB)"
+    )
+    assert len(listed) == USERS
+    assert all(u["profile_picture"].endswith("/thumb") for u in listed if u["role"] == "employee")
+    assert len(body) * 20 < inline_bytes
+    assert latency < LATENCY_BUDGET_SECONDS